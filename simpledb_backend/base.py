@@ -153,19 +153,10 @@ class DatabaseCursor:
     
     def execute(self, sql, params=None):
         """Execute a SQL query"""
-        # Very basic SQL execution with parameter substitution
-        if params:
-            # Simple parameter substitution
-            for param in params:
-                if isinstance(param, str):
-                    sql = sql.replace('%s', f"'{param}'", 1)
-                elif param is None:
-                    sql = sql.replace('%s', 'NULL', 1)
-                else:
-                    sql = sql.replace('%s', str(param), 1)
-        
         try:
-            result = self.rdbms.execute(sql)
+            # %s placeholders are bound by the RDBMS parser itself, so
+            # parameter values are never spliced into the SQL text
+            result = self.rdbms.execute(sql, params)
             if isinstance(result, list):
                 self._results = result
                 self.rowcount = len(result)
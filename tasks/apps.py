@@ -8,3 +8,10 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+    
+    def ready(self):
+        from django.core.signals import request_finished
+        from .db_wrapper import TaskDB
+        
+        # Changes made while handling a request are saved once, at its end
+        request_finished.connect(TaskDB.flush, dispatch_uid='tasks_db_flush')
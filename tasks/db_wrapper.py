@@ -3,10 +3,17 @@
 Wrapper around our custom RDBMS to make it easy to use in Django views.
 This initializes the database with the required schema.
 """
+import atexit
 import os
+import threading
 from pathlib import Path
 from simple_rdbms import RDBMS, Column, DataType
 
+try:
+    import fcntl
+except ImportError:  # not on Windows; the single-process check is skipped
+    fcntl = None
+
 # Store the database file in the project root
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_FILE = BASE_DIR / 'custom_rdbms.db'
@@ -14,79 +21,116 @@ DB_FILE = BASE_DIR / 'custom_rdbms.db'
 class TaskDB:
     _instance = None
     _initialized = False
+    _dirty = False
+    # Bumped by mark_dirty() on every change, so a page can tell whether the
+    # data it last showed is still current
+    data_version = 0
+    _lock = threading.Lock()
+    # Held open for the life of the process; see _lock_file()
+    _lock_fd = None
     
     @classmethod
     def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = RDBMS()
+        if cls._instance is not None:
+            return cls._instance
+        
+        # Only one thread builds the instance; any others wait here and
+        # then find it already set
+        with cls._lock:
+            if cls._instance is not None:
+                return cls._instance
+            
+            cls._lock_file()
+            instance = RDBMS()
             
             # Try to load existing database
             if os.path.exists(DB_FILE):
                 try:
                     from simple_rdbms import Database
-                    cls._instance.db = Database.load(str(DB_FILE))
+                    instance.db = Database.load(str(DB_FILE))
                     cls._initialized = True
                     print(f"Loaded existing database from {DB_FILE}")
                 except Exception as e:
                     print(f"Failed to load database: {e}")
+                    # Keep the unreadable files for recovery rather than
+                    # saving the fresh database over them
+                    for path in (DB_FILE, Path(f"{DB_FILE}.wal")):
+                        if path.exists():
+                            path.replace(f"{path}.corrupt")
                     print("Initializing fresh database...")
-                    cls._initialize_schema()
+                    cls._initialize_schema(instance)
             else:
                 print("No existing database found. Creating new one...")
-                cls._initialize_schema()
+                cls._initialize_schema(instance)
+            
+            # Release the WAL handle the database keeps open between saves
+            atexit.register(instance.db.close)
+            # Published last, so other threads never see a half-built instance
+            cls._instance = instance
         
-        return cls._instance
+        return instance
     
     @classmethod
-    def _initialize_schema(cls):
+    def _lock_file(cls):
+        """Refuse to open the database in a second process."""
+        # Each process keeps its own copy in memory and appends to the same
+        # WAL, so a second writer would interleave conflicting records
+        if fcntl is None or cls._lock_fd is not None:
+            return
+        fd = os.open(f"{DB_FILE}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(
+                f"{DB_FILE} is in use by another process; run a single worker"
+            ) from None
+        cls._lock_fd = fd
+    
+    @classmethod
+    def _initialize_schema(cls, rdbms):
         """Initialize database schema with tables and sample data."""
         if cls._initialized:
             return
-            
-        rdbms = cls._instance
+        
+        # The schema is fixed, so it is built through the Database API
+        # directly rather than parsed from SQL
+        db = rdbms.db
         
         try:
             # Create users table
             print("Creating users table...")
-            rdbms.execute("""
-                CREATE TABLE users (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    email TEXT UNIQUE
-                )
-            """)
-            
+            db.create_table('users', [
+                Column('id', DataType.INTEGER, primary_key=True),
+                Column('name', DataType.TEXT, not_null=True),
+                Column('email', DataType.TEXT, unique=True),
+            ])
+        
             # Create tasks table
             print("Creating tasks table...")
-            rdbms.execute("""
-                CREATE TABLE tasks (
-                    id INTEGER PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    status TEXT NOT NULL,
-                    priority INTEGER
-                )
-            """)
-            
+            db.create_table('tasks', [
+                Column('id', DataType.INTEGER, primary_key=True),
+                Column('user_id', DataType.INTEGER, not_null=True),
+                Column('title', DataType.TEXT, not_null=True),
+                Column('description', DataType.TEXT),
+                Column('status', DataType.TEXT, not_null=True),
+                Column('priority', DataType.INTEGER),
+            ])
+        
             # Create index on user_id for faster joins
             print("Creating index on tasks.user_id...")
-            rdbms.execute("CREATE INDEX ON tasks (user_id)")
-            
+            db.get_table('tasks').create_index('user_id')
+        
             # Add sample data
             print("Adding sample users...")
-            rdbms.execute("""
-                INSERT INTO users (name, email)
-                VALUES ('Alice Smith', 'alice@example.com')
-            """)
-            
-            rdbms.execute("""
-                INSERT INTO users (name, email)
-                VALUES ('Bob Jones', 'bob@example.com')
-            """)
-            
-            # Save the initialized database
-            cls.save()
+            db.get_table('users').insert_many([
+                {'name': 'Alice Smith', 'email': 'alice@example.com'},
+                {'name': 'Bob Jones', 'email': 'bob@example.com'},
+            ])
+        
+            # Save the initialized database in one synced write
+            db.save(str(DB_FILE), sync=True)
+            print(f"Database saved to {DB_FILE}")
             cls._initialized = True
             print("Database initialized successfully!")
             
@@ -99,8 +143,27 @@ class TaskDB:
             raise
     
     @classmethod
-    def save(cls):
-        """Save the database to disk."""
+    def save(cls, sync=False):
+        """Save the database to disk (fsynced with sync=True)."""
         if cls._instance:
-            cls._instance.db.save(str(DB_FILE))
-            print(f"Database saved to {DB_FILE}")
\ No newline at end of file
+            cls._instance.db.save(str(DB_FILE), sync=sync)
+            print(f"Database saved to {DB_FILE}")
+    
+    @classmethod
+    def mark_dirty(cls):
+        """Note unsaved changes; flush() writes them once the request finishes."""
+        with cls.get_instance().db.lock:
+            cls._dirty = True
+            cls.data_version += 1
+    
+    @classmethod
+    def flush(cls, **kwargs):
+        """Save the database if it was marked dirty (request_finished handler)."""
+        # Under the lock statements run under, so no change lands between
+        # clearing the flag and saving
+        if cls._instance is None:
+            return
+        with cls._instance.db.lock:
+            if cls._dirty:
+                cls._dirty = False
+                cls.save()
@@ -5,6 +5,9 @@ Demonstrates CRUD operations with our custom SimpleRDBMS
 
 from django.db import models
 
+# Display names by priority value; 0 stands in for anything out of range
+_PRIORITY_NAMES = ('Unknown', 'Low', 'Medium', 'High')
+
 
 class Task(models.Model):
     """
@@ -22,8 +25,10 @@ class Task(models.Model):
         return self.title
     
     def get_priority_display(self):
-        priorities = {1: 'Low', 2: 'Medium', 3: 'High'}
-        return priorities.get(self.priority, 'Unknown')
+        priority = self.priority
+        if isinstance(priority, int) and 0 < priority < len(_PRIORITY_NAMES):
+            return _PRIORITY_NAMES[priority]
+        return _PRIORITY_NAMES[0]
 
 
 class Category(models.Model):
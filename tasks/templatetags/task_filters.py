@@ -8,6 +8,8 @@ register = template.Library()
 @register.filter
 def lookup(dictionary, key):
     """Template filter to look up dictionary values by key."""
-    if isinstance(dictionary, dict):
-        return dictionary.get(key)
-    return None
+    # A missing key or a value that cannot be indexed renders as None
+    try:
+        return dictionary[key]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
@@ -1,19 +1,23 @@
-
-# tasks/urls.py
 """
 URL Configuration for Task Manager
 """
 
-from django.urls import path
+from django.urls import path, include
 from . import views
 
+# Routes sharing a prefix are grouped under it, so a request is only
+# matched against the patterns of its own group
 urlpatterns = [
     path('', views.index, name='index'),
     path('task/create/', views.create_task, name='create_task'),
-    path('task/<int:task_id>/update/', views.update_task, name='update_task'),
-    path('task/<int:task_id>/delete/', views.delete_task, name='delete_task'),
+    path('task/<int:task_id>/', include([
+        path('update/', views.update_task, name='update_task'),
+        path('delete/', views.delete_task, name='delete_task'),
+        path('edit/', views.edit_task, name='edit_task'),
+    ])),
     path('user/create/', views.create_user, name='create_user'),
-    path('task/<int:task_id>/edit/', views.edit_task, name='edit_task'),
-    path('sql/execute/', views.execute_sql, name='execute_sql'),
-    path('sql/schema/', views.get_table_schema, name='get_table_schema'),
-]
\ No newline at end of file
+    path('sql/', include([
+        path('execute/', views.execute_sql, name='execute_sql'),
+        path('schema/', views.get_table_schema, name='get_table_schema'),
+    ])),
+]
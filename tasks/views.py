@@ -2,36 +2,128 @@
 """
 Django views for the task manager application.
 """
+import json
+import os
+import re
+import time
+from operator import itemgetter
+
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.core.cache import cache
+from django.views.decorators.http import condition
+from simple_rdbms import COUNT_COLUMN
 from .db_wrapper import TaskDB
 
+try:
+    import orjson
+except ImportError:  # optional; falls back to Django's encoder
+    orjson = None
+
+# The user list changes far less often than the home page is loaded, so it
+# is kept in the cache and dropped whenever users may have changed
+USERS_CACHE_KEY = 'task_users_v1'
+USERS_CACHE_TIMEOUT = 300
+
+# Likewise the page's joined task rows and per-status counts (the rendered
+# page is not: its forms carry a per-user CSRF token)
+TASKS_CACHE_KEY = 'dashboard_tasks_v2'
+TASKS_CACHE_TIMEOUT = 60
+
+TASK_STATUSES = ('pending', 'in-progress', 'completed')
+
+# Tells this process's data versions apart from another's (or a restarted
+# one's), which count from zero again
+_PROCESS_TAG = f'{os.getpid():x}-{int(time.time()):x}'
+
+# Statements from the SQL console that change data or schema
+_MUTATING_RE = re.compile(r'(?:INSERT|UPDATE|DELETE|CREATE|DROP)\b', re.IGNORECASE)
+
+# The row dict of a (row_id, row) pair from a single-table SELECT
+_row_dict = itemgetter(1)
+
+# get_table_schema answers by table name ('' for the table list), as
+# (schema version, encoded JSON)
+_schema_cache = {}
+
+# The TaskDB instance, bound on first use; it lives as long as the process
+_rdbms = None
+
+
+def _db():
+    """Return the TaskDB instance, looking it up only on the first call."""
+    global _rdbms
+    if _rdbms is None:
+        _rdbms = TaskDB.get_instance()
+    return _rdbms
+
 
+def _result_response(data):
+    """JSON response for a SQL console result set, encoded by orjson if installed."""
+    from django.http import HttpResponse, JsonResponse
+    
+    if orjson is not None:
+        try:
+            return HttpResponse(orjson.dumps(data), content_type='application/json')
+        except TypeError:
+            # e.g. an INTEGER wider than 64 bits; the stdlib encoder copes
+            pass
+    return JsonResponse(data)
+
+
+def _index_etag(request):
+    """ETag of the index page, or None when it has to be rendered anyway."""
+    # Pending messages are shown only once, and without a CSRF cookie the
+    # render is what sets one, so neither page may be answered with a 304
+    if len(messages.get_messages(request)) or not request.COOKIES.get(settings.CSRF_COOKIE_NAME):
+        return None
+    # Weak: the forms' masked CSRF token differs between renders
+    return f'W/"{_PROCESS_TAG}-{TaskDB.data_version}"'
+
+
+@condition(etag_func=_index_etag)
 def index(request):
     """Main page showing all tasks."""
-    rdbms = TaskDB.get_instance()
+    rdbms = _db()
     
     try:
-        # Get all tasks with user information via JOIN
-        raw_tasks = rdbms.execute("""
-            SELECT * FROM tasks
-            JOIN users ON tasks.user_id = users.id
-        """)
-        
-        tasks = raw_tasks if raw_tasks else []
+        # Get all tasks with user information via JOIN, keeping only the
+        # columns the page shows
+        cached = cache.get(TASKS_CACHE_KEY)
+        if cached is None:
+            raw_tasks = rdbms.execute("""
+                SELECT tasks.id, tasks.user_id, tasks.title, tasks.description,
+                       tasks.status, tasks.priority, users.name
+                FROM tasks
+                JOIN users ON tasks.user_id = users.id
+            """)
+            tasks = raw_tasks if raw_tasks else []
+            # Counted by the engine, which builds no rows for COUNT(*)
+            status_counts = [
+                (status, rdbms.execute("SELECT COUNT(*) FROM tasks WHERE status = %s", [status])[0][1][COUNT_COLUMN])
+                for status in TASK_STATUSES
+            ]
+            cached = (tasks, status_counts)
+            cache.set(TASKS_CACHE_KEY, cached, TASKS_CACHE_TIMEOUT)
+        tasks, status_counts = cached
         
         # Get all users for the form
-        raw_users = rdbms.execute("SELECT * FROM users")
-        
-        users = raw_users if raw_users else []
+        users = cache.get(USERS_CACHE_KEY)
+        if users is None:
+            raw_users = rdbms.execute("SELECT id, name FROM users")
+            users = raw_users if raw_users else []
+            cache.set(USERS_CACHE_KEY, users, USERS_CACHE_TIMEOUT)
         
     except Exception as e:
         messages.error(request, f"Database error: {e}")
         tasks = []
+        status_counts = []
         users = []
     
     context = {
         'tasks': tasks,
+        'status_counts': status_counts,
         'users': users
     }
     
@@ -41,7 +133,7 @@ def index(request):
 def create_task(request):
     """Create a new task."""
     if request.method == 'POST':
-        rdbms = TaskDB.get_instance()
+        rdbms = _db()
         
         user_id = request.POST.get('user_id')
         title = request.POST.get('title')
@@ -50,17 +142,15 @@ def create_task(request):
         priority = request.POST.get('priority', '1')
         
         try:
-            # Escape single quotes in strings
-            title = title.replace("'", "''")
-            description = description.replace("'", "''")
-            
-            result = rdbms.execute(f"""
+            # Values are bound as parameters, so no quoting is needed
+            result = rdbms.execute("""
                 INSERT INTO tasks (user_id, title, description, status, priority)
-                VALUES ({user_id}, '{title}', '{description}', '{status}', {priority})
-            """)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [int(user_id), title, description, status, int(priority)])
             
-            # Save to disk after modification
-            TaskDB.save()
+            # Saved to disk once the request finishes
+            TaskDB.mark_dirty()
+            cache.delete(TASKS_CACHE_KEY)
             
             messages.success(request, 'Task created successfully!')
             
@@ -73,19 +163,20 @@ def create_task(request):
 def update_task(request, task_id):
     """Update a task's status."""
     if request.method == 'POST':
-        rdbms = TaskDB.get_instance()
+        rdbms = _db()
         
         status = request.POST.get('status')
         
         try:
             # Update the status
-            result = rdbms.execute(f"""
-                UPDATE tasks SET status = '{status}'
-                WHERE id = {task_id}
-            """)
+            result = rdbms.execute("""
+                UPDATE tasks SET status = %s
+                WHERE id = %s
+            """, [status, task_id])
             
-            # Save to disk after modification
-            TaskDB.save()
+            # Saved to disk once the request finishes
+            TaskDB.mark_dirty()
+            cache.delete(TASKS_CACHE_KEY)
             
             messages.success(request, 'Task updated successfully!')
             
@@ -98,15 +189,16 @@ def update_task(request, task_id):
 def delete_task(request, task_id):
     """Delete a task."""
     if request.method == 'POST':
-        rdbms = TaskDB.get_instance()
+        rdbms = _db()
         
         try:
-            result = rdbms.execute(f"""
-                DELETE FROM tasks WHERE id = {task_id}
-            """)
+            result = rdbms.execute("""
+                DELETE FROM tasks WHERE id = %s
+            """, [task_id])
             
-            # Save to disk after modification
-            TaskDB.save()
+            # Saved to disk once the request finishes
+            TaskDB.mark_dirty()
+            cache.delete(TASKS_CACHE_KEY)
             
             messages.success(request, 'Task deleted successfully!')
             
@@ -118,7 +210,7 @@ def delete_task(request, task_id):
 def edit_task(request, task_id):
     """Handle task updates via modal form."""
     if request.method == 'POST':
-        rdbms = TaskDB.get_instance()
+        rdbms = _db()
         
         user_id = request.POST.get('user_id')
         title = request.POST.get('title')
@@ -127,22 +219,19 @@ def edit_task(request, task_id):
         priority = request.POST.get('priority', '1')
         
         try:
-            # Escape single quotes in strings
-            title = title.replace("'", "''")
-            description = description.replace("'", "''")
-            
-            result = rdbms.execute(f"""
+            result = rdbms.execute("""
                 UPDATE tasks 
-                SET user_id = {user_id}, 
-                    title = '{title}', 
-                    description = '{description}', 
-                    status = '{status}', 
-                    priority = {priority}
-                WHERE id = {task_id}
-            """)
+                SET user_id = %s, 
+                    title = %s, 
+                    description = %s, 
+                    status = %s, 
+                    priority = %s
+                WHERE id = %s
+            """, [int(user_id), title, description, status, int(priority), task_id])
             
-            # Save to disk after modification
-            TaskDB.save()
+            # Saved to disk once the request finishes
+            TaskDB.mark_dirty()
+            cache.delete(TASKS_CACHE_KEY)
             
             messages.success(request, 'Task updated successfully!')
             
@@ -154,23 +243,20 @@ def edit_task(request, task_id):
 def create_user(request):
     """Create a new user."""
     if request.method == 'POST':
-        rdbms = TaskDB.get_instance()
+        rdbms = _db()
         
         name = request.POST.get('name')
         email = request.POST.get('email')
         
         try:
-            # Escape single quotes in strings
-            name = name.replace("'", "''")
-            email = email.replace("'", "''")
-            
-            result = rdbms.execute(f"""
+            result = rdbms.execute("""
                 INSERT INTO users (name, email)
-                VALUES ('{name}', '{email}')
-            """)
+                VALUES (%s, %s)
+            """, [name, email])
             
-            # Save to disk after modification
-            TaskDB.save()
+            # Saved to disk once the request finishes
+            TaskDB.mark_dirty()
+            cache.delete(USERS_CACHE_KEY)
             
             messages.success(request, 'User created successfully!')
             
@@ -185,19 +271,18 @@ def execute_sql(request):
     from django.http import JsonResponse
     
     if request.method == 'POST':
-        rdbms = TaskDB.get_instance()
+        rdbms = _db()
         query = request.POST.get('query', '').strip()
         
         if not query:
             return JsonResponse({'error': 'Query cannot be empty'}, status=400)
         
+        # Check if query modifies data
+        mutating = _MUTATING_RE.match(query) is not None
         try:
             result = rdbms.execute(query)
             
-            # Check if query modifies data
-            query_upper = query.upper().strip()
-            if any(query_upper.startswith(cmd) for cmd in ['INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP']):
-                TaskDB.save()
+            if mutating:
                 return JsonResponse({
                     'success': True,
                     'message': 'Query executed successfully',
@@ -209,16 +294,16 @@ def execute_sql(request):
                 # Check if it's a list of tuples (row_id, row_dict) or list of dicts
                 if isinstance(result[0], tuple):
                     # Format: [(row_id, {col: val, ...}), ...]
-                    normalized_data = [row[1] for row in result]
+                    normalized_data = list(map(_row_dict, result))
                 elif isinstance(result[0], dict):
                     # Format: [{col: val, ...}, ...] (from JOIN)
                     normalized_data = result
                 else:
                     normalized_data = []
                 
-                return JsonResponse({
+                return _result_response({
                     'success': True,
-                    'columns': list(normalized_data[0].keys()) if normalized_data else [],
+                    'columns': list(normalized_data[0]) if normalized_data else [],
                     'data': normalized_data
                 })
             else:
@@ -231,45 +316,58 @@ def execute_sql(request):
             
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
+        finally:
+            # Also after an error, which may come partway through a statement
+            if mutating:
+                TaskDB.mark_dirty()
+                cache.delete_many([USERS_CACHE_KEY, TASKS_CACHE_KEY])
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
 def get_table_schema(request):
     """Get schema information for a specific table."""
-    from django.http import JsonResponse
+    from django.http import HttpResponse, JsonResponse
     
     table_name = request.GET.get('table', '')
+    rdbms = _db()
+    version = rdbms.db.schema_version
+    
+    # Serve the encoded answer from the last call while the schema is unchanged
+    cached = _schema_cache.get(table_name)
+    if cached is not None and cached[0] == version:
+        return HttpResponse(cached[1], content_type='application/json')
     
     if not table_name:
         # Return list of all tables
-        rdbms = TaskDB.get_instance()
         tables = list(rdbms.db.tables.keys())
-        return JsonResponse({'tables': tables})
+        data = {'tables': tables}
+    else:
+        try:
+            if table_name not in rdbms.db.tables:
+                return JsonResponse({'error': f'Table "{table_name}" not found'}, status=404)
+            
+            table = rdbms.db.tables[table_name]
+            
+            # Get column information - columns is a dict, not a list
+            columns = []
+            for col_name, col in table.columns.items():
+                columns.append({
+                    'name': col.name,
+                    'type': col.dtype.value,  # Get the string value of the enum
+                    'primary_key': col.primary_key,
+                    'unique': col.unique,
+                    'nullable': not col.not_null
+                })
+            
+            data = {
+                'table': table_name,
+                'columns': columns
+            }
+            
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
     
-    try:
-        rdbms = TaskDB.get_instance()
-        
-        if table_name not in rdbms.db.tables:
-            return JsonResponse({'error': f'Table "{table_name}" not found'}, status=404)
-        
-        table = rdbms.db.tables[table_name]
-        
-        # Get column information - columns is a dict, not a list
-        columns = []
-        for col_name, col in table.columns.items():
-            columns.append({
-                'name': col.name,
-                'type': col.dtype.value,  # Get the string value of the enum
-                'primary_key': col.primary_key,
-                'unique': col.unique,
-                'nullable': not col.not_null
-            })
-        
-        return JsonResponse({
-            'table': table_name,
-            'columns': columns
-        })
-        
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
\ No newline at end of file
+    content = json.dumps(data)
+    _schema_cache[table_name] = (version, content)
+    return HttpResponse(content, content_type='application/json')
@@ -0,0 +1,509 @@
+"""
+Tests for the SimpleRDBMS engine (run with: python -m unittest test_simple_rdbms)
+"""
+import os
+import pickle
+import tempfile
+import threading
+import time
+import unittest
+
+from simple_rdbms import COUNT_COLUMN, RDBMS, BackgroundSaver, Column, Database, DataType, Index, SQLParser, Table
+
+
+class RDBMSTestCase(unittest.TestCase):
+    """Gives each test an RDBMS and a database file in a temporary directory."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.filename = os.path.join(self.tmp.name, 'test.db')
+        self.rdbms = RDBMS()
+        self.addCleanup(self.rdbms.db.close)
+        self.rdbms.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, qty INTEGER, price REAL)")
+
+    def reload(self):
+        self.rdbms.db.close()
+        db = Database.load(self.filename)
+        self.addCleanup(db.close)
+        return db
+
+    def names(self, rows):
+        return sorted(row['name'] for _, row in rows)
+
+
+class WALReplayTests(RDBMSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rdbms.db.save(self.filename)
+        self.wal_file = self.filename + '.wal'
+
+    def insert(self, *names):
+        for name in names:
+            self.rdbms.execute("INSERT INTO items (name, qty) VALUES (%s, %s)", [name, 1])
+        self.rdbms.db.save(self.filename)
+
+    def wal_bytes(self):
+        with open(self.wal_file, 'rb') as f:
+            return f.read()
+
+    def write_wal(self, data):
+        with open(self.wal_file, 'wb') as f:
+            f.write(data)
+
+    def test_changes_are_replayed_from_the_wal(self):
+        self.insert('a', 'b')
+        self.rdbms.execute("UPDATE items SET qty = 5 WHERE name = 'a'")
+        self.rdbms.execute("DELETE FROM items WHERE name = 'b'")
+        self.rdbms.db.save(self.filename)
+        self.assertTrue(os.path.getsize(self.wal_file))
+
+        db = self.reload()
+        rows = db.get_table('items').select()
+        self.assertEqual([(row['name'], row['qty']) for _, row in rows], [('a', 5)])
+
+    def test_torn_tail_is_dropped_and_later_appends_survive(self):
+        self.insert('a', 'b')
+        data = self.wal_bytes()
+        self.write_wal(data + data.split(b'\n')[0][:10])
+
+        db = self.reload()
+        self.assertEqual(self.names(db.get_table('items').select()), ['a', 'b'])
+        self.assertEqual(self.wal_bytes(), data)
+
+    def test_unterminated_tail_is_dropped_even_if_it_parses(self):
+        self.insert('a', 'b', 'c')
+        data = self.wal_bytes()
+        self.write_wal(data[:-1])
+
+        db = self.reload()
+        self.assertEqual(self.names(db.get_table('items').select()), ['a', 'b'])
+
+        # Appends after the reload start on a fresh line and are kept
+        rdbms = RDBMS()
+        rdbms.db = db
+        rdbms.execute("INSERT INTO items (name) VALUES ('d')")
+        db.save(self.filename)
+        self.assertEqual(self.names(self.reload().get_table('items').select()), ['a', 'b', 'd'])
+
+    def test_corrupt_record_before_the_tail_raises(self):
+        self.insert('a', 'b', 'c')
+        lines = self.wal_bytes().split(b'\n')
+        lines[1] = b'{not json'
+        self.write_wal(b'\n'.join(lines))
+
+        with self.assertRaises(ValueError):
+            Database.load(self.filename)
+
+    def test_duplicated_record_raises(self):
+        self.insert('a', 'b')
+        lines = self.wal_bytes().split(b'\n')
+        # The insert of 'a' appended twice
+        lines.insert(2, lines[1])
+        self.write_wal(b'\n'.join(lines))
+
+        with self.assertRaisesRegex(ValueError, 'Corrupt record'):
+            Database.load(self.filename)
+
+    def test_compaction_folds_the_wal_into_the_snapshot(self):
+        self.insert('a', 'b')
+        self.rdbms.execute("DELETE FROM items WHERE name = 'a'")
+        self.rdbms.db.compact(self.filename)
+        self.assertFalse(os.path.exists(self.wal_file))
+
+        db = self.reload()
+        self.assertEqual(self.names(db.get_table('items').select()), ['b'])
+        # The primary key index is rebuilt with the table
+        self.assertEqual(self.names(db.get_table('items').select_indexed('id', 2)), ['b'])
+
+    def test_wal_left_by_a_crashed_compaction_is_not_replayed(self):
+        self.insert('a', 'b')
+        stale = self.wal_bytes()
+        self.rdbms.db.compact(self.filename)
+        # As if the process died between swapping in the snapshot and
+        # removing the WAL it already contains
+        self.write_wal(stale)
+
+        db = self.reload()
+        self.assertEqual(self.names(db.get_table('items').select()), ['a', 'b'])
+        self.assertEqual(self.wal_bytes(), b'')
+
+        # The next generation's WAL is replayed as usual
+        rdbms = RDBMS()
+        rdbms.db = db
+        rdbms.execute("INSERT INTO items (name) VALUES ('c')")
+        db.save(self.filename)
+        self.assertEqual(self.names(self.reload().get_table('items').select()), ['a', 'b', 'c'])
+
+    def test_statement_run_during_a_save_is_not_lost(self):
+        self.insert('a')
+        db = self.rdbms.db
+        writer = threading.Thread(target=self.rdbms.execute,
+                                  args=("INSERT INTO items (name) VALUES ('b')",))
+
+        class SlowWAL:
+            """Lets another thread run a statement while the WAL is written."""
+            def __init__(self, f):
+                self.f = f
+
+            def write(self, data):
+                writer.start()
+                writer.join(0.2)
+                return self.f.write(data)
+
+            def __getattr__(self, name):
+                return getattr(self.f, name)
+
+        self.rdbms.execute("INSERT INTO items (name) VALUES ('c')")
+        db._wal = SlowWAL(db._wal)
+        db.save(self.filename)
+        writer.join()
+        db._wal = db._wal.f
+        db.save(self.filename)
+        self.assertEqual(self.names(self.reload().get_table('items').select()), ['a', 'b', 'c'])
+
+    def test_save_compacts_once_the_wal_is_large(self):
+        self.rdbms.db.WAL_MAX_BYTES = 0
+        self.insert('a')
+        self.insert('b')
+        self.assertFalse(os.path.exists(self.wal_file))
+        self.assertEqual(self.names(self.reload().get_table('items').select()), ['a', 'b'])
+
+
+class BackgroundSaverTests(RDBMSTestCase):
+
+    def saver(self, interval):
+        saver = BackgroundSaver(self.rdbms.db, self.filename, interval)
+        self.addCleanup(saver.close)
+        return saver
+
+    def test_changes_are_saved_in_the_background(self):
+        saver = self.saver(0.01)
+        self.rdbms.execute("INSERT INTO items (name) VALUES ('a')")
+        saver.mark_dirty()
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.filename) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.names(Database.load(self.filename).get_table('items').select()), ['a'])
+
+    def test_close_saves_without_waiting_out_the_interval(self):
+        saver = self.saver(60)
+        self.rdbms.execute("INSERT INTO items (name) VALUES ('a')")
+        saver.mark_dirty()
+        time.sleep(0.05)  # the writer is now waiting out the interval
+        started = time.monotonic()
+        saver.close()
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertEqual(self.names(self.reload().get_table('items').select()), ['a'])
+
+
+class Pickled:
+    """Pickles as an instance of cls with the given attribute dict."""
+
+    def __init__(self, cls, state):
+        self.cls = cls
+        self.state = state
+
+    def __reduce__(self):
+        return object.__new__, (self.cls,), self.state
+
+
+class LegacyLoadTests(RDBMSTestCase):
+    """Files written before snapshots pickled the Database object itself."""
+
+    def setUp(self):
+        super().setUp()
+        columns = {
+            'id': Pickled(Column, {'name': 'id', 'dtype': DataType.INTEGER, 'primary_key': True,
+                                   'unique': False, 'not_null': False}),
+            'email': Pickled(Column, {'name': 'email', 'dtype': DataType.TEXT, 'primary_key': False,
+                                      'unique': True, 'not_null': False}),
+        }
+        rows = {1: {'id': 1, 'email': 'a@x'}, 3: {'id': 3, 'email': 'b@x'}}
+        indexes = {name: Pickled(Index, {'column_name': name, 'index': {}}) for name in ('id', 'email')}
+        users = Pickled(Table, {'name': 'users', 'columns': columns, 'rows': rows,
+                                'next_id': 4, 'indexes': indexes})
+        with open(self.filename, 'wb') as f:
+            pickle.dump(Pickled(Database, {'tables': {'users': users}}), f)
+
+    def emails(self, db):
+        return sorted(row['email'] for _, row in db.get_table('users').select())
+
+    def test_rows_and_indexes_are_rebuilt(self):
+        db = self.reload()
+        users = db.get_table('users')
+        self.assertEqual(self.emails(db), ['a@x', 'b@x'])
+        self.assertEqual(users.select_indexed('email', 'b@x'), [(3, {'id': 3, 'email': 'b@x'})])
+        with self.assertRaises(ValueError):
+            users.insert({'email': 'a@x'})
+        self.assertEqual(users.insert({'email': 'c@x'}), 4)
+
+    def test_changes_are_logged_and_replayed(self):
+        self.rdbms.db = self.reload()
+        self.rdbms.execute("INSERT INTO users (email) VALUES ('c@x')")
+        self.rdbms.db.save(self.filename)
+        self.assertEqual(self.emails(self.reload()), ['a@x', 'b@x', 'c@x'])
+
+    def test_wal_without_a_header_is_replayed(self):
+        # As written before WALs began with a generation line
+        with open(self.filename + '.wal', 'wb') as f:
+            f.write(b'{"op": "insert", "table": "users", "row": {"id": 5, "email": "d@x"}}\n')
+        self.assertEqual(self.emails(self.reload()), ['a@x', 'b@x', 'd@x'])
+
+
+class ParameterBindingTests(RDBMSTestCase):
+
+    def test_both_placeholder_styles_bind_in_order(self):
+        self.rdbms.execute("INSERT INTO items (name, qty, price) VALUES (%s, ?, %s)", ["it's", 3, 2.5])
+        self.rdbms.execute("UPDATE items SET qty = ? WHERE name = %s", [4, "it's"])
+        rows = self.rdbms.execute("SELECT * FROM items WHERE qty = ? AND price = %s", [4, 2.5])
+        self.assertEqual([(row['name'], row['qty']) for _, row in rows], [("it's", 4)])
+
+    def test_values_are_not_spliced_into_the_sql(self):
+        self.rdbms.execute("INSERT INTO items (name) VALUES ('a')")
+        payload = "x' OR name = 'a"
+        self.assertEqual(self.rdbms.execute("SELECT * FROM items WHERE name = %s", [payload]), [])
+        self.rdbms.execute("INSERT INTO items (name) VALUES (%s)", [payload])
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE name = ?", [payload])),
+                         [payload])
+
+    def test_statements_are_cached_by_text_not_values(self):
+        SQLParser._parse_cached.cache_clear()
+        for i in range(5):
+            self.rdbms.execute("INSERT INTO items (name, qty) VALUES (%s, %s)", [f'n{i}', i])
+            self.rdbms.execute("SELECT * FROM items WHERE qty >= %s", [i])
+        info = SQLParser._parse_cached.cache_info()
+        self.assertEqual((info.misses, info.hits), (2, 8))
+        # Each call still sees its own values
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE qty >= %s", [3])),
+                         ['n3', 'n4'])
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE qty >= %s", [1])),
+                         ['n1', 'n2', 'n3', 'n4'])
+
+    def test_is_placeholder_must_be_bound_to_null(self):
+        self.rdbms.execute("INSERT INTO items (name) VALUES ('a')")
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE qty IS %s", [None])), ['a'])
+        with self.assertRaises(ValueError):
+            self.rdbms.execute("SELECT * FROM items WHERE qty IS %s", [1])
+
+    def test_quoted_numbers_are_coerced_in_where_as_in_values(self):
+        self.rdbms.execute("INSERT INTO items (name, qty, price) VALUES ('a', '3', '1.5')")
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE qty = '3'")), ['a'])
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE id = '1' AND price = '1.5'")),
+                         ['a'])
+        self.rdbms.execute("UPDATE items SET qty = '4' WHERE qty = '3'")
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE qty = 4")), ['a'])
+
+    def test_equality_with_null_matches_nothing(self):
+        self.rdbms.execute("INSERT INTO items (name) VALUES ('a')")
+        self.rdbms.execute("INSERT INTO items (name, qty) VALUES ('b', 1)")
+        for where, values in [("qty = NULL", None), ("qty != NULL", None), ("NULL = qty", None),
+                              ("qty = %s", [None]), ("qty <> %s", [None]), ("id = %s", [None])]:
+            self.assertEqual(self.rdbms.execute(f"SELECT * FROM items WHERE {where}", values), [], where)
+        self.assertEqual(self.names(self.rdbms.execute("SELECT * FROM items WHERE qty = %s OR qty IS NULL",
+                                                       [None])), ['a'])
+
+    def test_parameter_count_must_match(self):
+        with self.assertRaises(ValueError):
+            self.rdbms.execute("SELECT * FROM items WHERE qty = %s", [])
+        with self.assertRaises(ValueError):
+            self.rdbms.execute("SELECT * FROM items WHERE qty = %s", [1, 2])
+
+
+class IndexedLookupTests(unittest.TestCase):
+    """Indexed and range lookups must return exactly the rows a full scan does."""
+
+    PREDICATES = [
+        "qty = 3", "3 = qty", "qty = 99", "qty < 3", "qty <= 3", "qty > 3", "qty >= 3",
+        "2 < qty", "qty = 3 AND name = 'n7'", "qty > 2 AND qty < 6", "qty >= 4 AND price > 1.0",
+        "qty = 3 OR qty = 5", "qty > 'x'", "qty = NULL", "qty != NULL", "qty IS NULL", "id = 4", "id >= 15",
+    ]
+
+    def setUp(self):
+        self.rdbms = RDBMS()
+        for table in ('plain', 'indexed'):
+            self.rdbms.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT, qty INTEGER, price REAL)")
+        self.rdbms.execute("CREATE INDEX ON indexed (qty)")
+        for table in ('plain', 'indexed'):
+            for i in range(20):
+                qty = None if i % 7 == 0 else i % 6
+                self.rdbms.execute(f"INSERT INTO {table} (name, qty, price) VALUES (%s, %s, %s)",
+                                   [f'n{i}', qty, i / 4])
+            self.rdbms.execute(f"DELETE FROM {table} WHERE name = 'n9'")
+            self.rdbms.execute(f"UPDATE {table} SET qty = 3 WHERE name = 'n2'")
+
+    def assertSameRows(self, sql, *args):
+        expected = self.rdbms.execute(sql.format(table='plain'), *args)
+        self.assertEqual(self.rdbms.execute(sql.format(table='indexed'), *args), expected, sql)
+
+    def test_where_clauses_match_a_full_scan(self):
+        for predicate in self.PREDICATES:
+            self.assertSameRows("SELECT * FROM {table} WHERE " + predicate)
+            self.assertSameRows("SELECT name FROM {table} WHERE " + predicate)
+
+    def test_update_and_delete_hit_the_same_rows(self):
+        for sql in ("UPDATE {table} SET price = 0.5 WHERE qty >= 4",
+                    "DELETE FROM {table} WHERE qty = 1 AND price > 1.0"):
+            for table in ('plain', 'indexed'):
+                self.rdbms.execute(sql.format(table=table))
+            self.assertSameRows("SELECT * FROM {table}")
+
+
+class InsertManyTests(RDBMSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.table = self.rdbms.db.get_table('items')
+        self.table.create_index('name')
+
+    def test_rows_are_inserted_and_indexed(self):
+        self.assertEqual(self.table.insert_many([{'name': 'a'}, {'name': 'b', 'qty': 2}]), [1, 2])
+        self.assertEqual(self.names(self.table.select_indexed('name', 'b')), ['b'])
+        self.assertEqual(self.table.insert({'name': 'c'}), 3)
+
+    def test_a_bad_row_leaves_the_table_unchanged(self):
+        self.table.insert({'name': 'a'})
+        bad_batches = [
+            [{'name': 'b'}, {'name': 'c', 'qty': 'three'}],
+            [{'name': 'b'}, {'id': 1, 'name': 'c'}],
+            [{'id': 5, 'name': 'b'}, {'id': 5, 'name': 'c'}],
+            [{'name': 'b'}, {'nope': 1}],
+        ]
+        for batch in bad_batches:
+            with self.assertRaises((TypeError, ValueError)):
+                self.table.insert_many(batch)
+            self.assertEqual(self.names(self.table.select()), ['a'])
+            self.assertEqual(self.table.select_indexed('name', 'b'), [])
+        self.assertEqual(self.table.insert({'name': 'd'}), 2)
+
+
+class JoinTests(RDBMSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rdbms.execute("CREATE TABLE stock (id INTEGER PRIMARY KEY, item_id INTEGER, place TEXT)")
+        for name in ('a', 'b', 'c'):
+            self.rdbms.execute("INSERT INTO items (name) VALUES (%s)", [name])
+        for item_id, place in [(1, 'x'), (1, 'y'), (2, 'x'), (None, 'x'), (99, 'z')]:
+            self.rdbms.execute("INSERT INTO stock (item_id, place) VALUES (%s, %s)", [item_id, place])
+
+    def pairs(self, sql):
+        return sorted((row['items.name'], row['stock.place']) for row in self.rdbms.execute(sql))
+
+    def test_join_matches_a_nested_loop(self):
+        expected = [('a', 'x'), ('a', 'y'), ('b', 'x')]
+        sql = "SELECT * FROM items JOIN stock ON items.id = stock.item_id"
+        self.assertEqual(self.pairs(sql), expected)
+        # The same result probing the right table's index instead of buckets
+        self.rdbms.execute("CREATE INDEX ON stock (item_id)")
+        self.assertEqual(self.pairs(sql), expected)
+        self.assertEqual(self.pairs("SELECT * FROM stock JOIN items ON stock.item_id = items.id"), expected)
+        # WHERE filters the left table, and comes before the JOIN
+        self.assertEqual(self.pairs("SELECT * FROM items WHERE name = 'a' JOIN stock ON items.id = stock.item_id"),
+                         expected[:2])
+
+    def test_join_rows_carry_every_column_prefixed(self):
+        [row] = self.rdbms.execute("SELECT * FROM items WHERE name = 'b' JOIN stock ON items.id = stock.item_id")
+        self.assertEqual(list(row), ['items.id', 'items.name', 'items.qty', 'items.price',
+                                     'stock.id', 'stock.item_id', 'stock.place'])
+
+
+class SelectColumnsTests(RDBMSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rdbms.execute("INSERT INTO items (name, qty) VALUES ('a', 1)")
+        self.rdbms.execute("INSERT INTO items (name, qty) VALUES ('b', 2)")
+
+    def test_rows_hold_just_the_listed_columns_in_order(self):
+        for sql in ("SELECT qty, name FROM items", "SELECT qty, items.name FROM items WHERE id >= 1",
+                    "SELECT qty, name FROM items WHERE id = 2"):
+            rows = self.rdbms.execute(sql)
+            self.assertEqual([list(row.items()) for _, row in rows][-1], [('qty', 2), ('name', 'b')], sql)
+
+    def test_join_columns_are_qualified(self):
+        self.rdbms.execute("CREATE TABLE stock (id INTEGER PRIMARY KEY, item_id INTEGER)")
+        self.rdbms.execute("INSERT INTO stock (item_id) VALUES (2)")
+        rows = self.rdbms.execute("SELECT items.name, stock.id FROM stock JOIN items ON stock.item_id = items.id")
+        self.assertEqual(rows, [{'items.name': 'b', 'stock.id': 1}])
+        with self.assertRaises(ValueError):
+            self.rdbms.execute("SELECT name FROM stock JOIN items ON stock.item_id = items.id")
+
+    def test_unknown_columns_are_rejected(self):
+        for sql in ("SELECT nope FROM items", "SELECT other.name FROM items", "SELECT name + 1 FROM items"):
+            with self.assertRaises(ValueError, msg=sql):
+                self.rdbms.execute(sql)
+
+
+class CountTests(RDBMSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(6):
+            self.rdbms.execute("INSERT INTO items (name, qty) VALUES (%s, %s)", [f'n{i}', i % 3])
+
+    def count(self, sql, values=None):
+        [(row_id, row)] = self.rdbms.execute(sql, values)
+        self.assertIsNone(row_id)
+        return row[COUNT_COLUMN]
+
+    def test_count_matches_the_rows_a_select_returns(self):
+        self.rdbms.execute("DELETE FROM items WHERE name = 'n0'")
+        self.assertEqual(self.count("SELECT COUNT(*) FROM items"), 5)
+        self.assertEqual(self.count("SELECT count( * ) FROM items WHERE qty = %s", [1]), 2)
+        self.rdbms.execute("CREATE INDEX ON items (qty)")
+        for where in ("qty = 0", "qty >= 1", "qty = 1 AND name = 'n4'", "qty = NULL"):
+            self.assertEqual(self.count(f"SELECT COUNT(*) FROM items WHERE {where}"),
+                             len(self.rdbms.execute(f"SELECT * FROM items WHERE {where}")), where)
+
+    def test_count_of_a_join_counts_the_joined_rows(self):
+        self.rdbms.execute("CREATE TABLE stock (id INTEGER PRIMARY KEY, item_id INTEGER)")
+        for item_id in (1, 1, 2, 99):
+            self.rdbms.execute("INSERT INTO stock (item_id) VALUES (%s)", [item_id])
+        self.assertEqual(self.count("SELECT COUNT(*) FROM stock JOIN items ON stock.item_id = items.id"), 3)
+
+
+class TextPoolTests(RDBMSTestCase):
+
+    def test_pools_are_reseeded_from_the_stored_values(self):
+        table = self.rdbms.db.get_table('items')
+        for name in ('gone', 'kept', 'kept'):
+            self.rdbms.execute("INSERT INTO items (name) VALUES (%s)", [name])
+        self.rdbms.execute("DELETE FROM items WHERE name = 'gone'")
+        table._compact()
+        self.assertEqual(list(table._text_pools['name']), ['kept'])
+
+        self.rdbms.db.compact(self.filename)
+        loaded = self.reload().get_table('items')
+        self.assertEqual(list(loaded._text_pools['name']), ['kept'])
+        [(_, first), (_, second)] = loaded.select()
+        self.assertIs(first['name'], second['name'])
+        self.assertIs(first['name'], loaded._text_pools['name']['kept'])
+
+
+class WALEncodingTests(RDBMSTestCase):
+
+    def test_integer_wider_than_64_bits_round_trips(self):
+        self.rdbms.db.save(self.filename)
+        wide = 10 ** 20
+        self.rdbms.execute("INSERT INTO items (name, qty) VALUES (%s, %s)", ['wide', wide])
+        self.rdbms.db.save(self.filename)
+
+        db = self.reload()
+        [(_, row)] = db.get_table('items').select()
+        self.assertEqual(row['qty'], wide)
+        self.assertIs(type(row['qty']), int)
+
+    def test_non_finite_real_is_rejected(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                self.rdbms.execute("INSERT INTO items (name, price) VALUES (%s, %s)", ['x', value])
+        self.rdbms.execute("INSERT INTO items (name, price) VALUES ('ok', 1.5)")
+        with self.assertRaises(ValueError):
+            self.rdbms.execute("UPDATE items SET price = %s WHERE id = 1", [float('nan')])
+        self.assertEqual(self.rdbms.db.get_table('items').select()[0][1]['price'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()